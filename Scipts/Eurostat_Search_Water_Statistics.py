@@ -1,36 +1,251 @@
+import functools
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from array import array
+import ijson
 import requests
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import formatdate
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from datetime import datetime
 
 BASE_URL = "https://ec.europa.eu/eurostat/api/dissemination/statistics/1.0/data"
+MAX_WORKERS = 8     # concurrent dataset downloads
+CACHE_DIR = os.path.join(".cache", "eurostat")
+NOT_MODIFIED = object()   # returned by fetch_eurostat_json on HTTP 304
+
+# Low-cardinality output columns, stored dictionary-encoded in the Parquet file
+CATEGORICAL_COLUMNS = ["dataset_code", "freq", "wat_proc", "unit", "geo", "wat_src"]
+
+# -------------------------------------------------
+# 0. Shared HTTP session (connection reuse + retries)
+# -------------------------------------------------
+def make_session() -> requests.Session:
+    """
+    Create a requests.Session with a connection pool sized for MAX_WORKERS
+    and retries on rate limiting / transient server errors.
+    """
+    retry = Retry(total=3,
+                  backoff_factor=0.5,
+                  status_forcelist=[429, 500, 502, 503, 504],
+                  raise_on_status=False)   # let fetch_eurostat_json log the final response
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
 
 # -------------------------------------------------
 # 1. Call Eurostat Statistics API (supports repeated params)
 # -------------------------------------------------
 #
-def fetch_eurostat_json(dataset_code: str,
-                        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
-                        lang: str = "EN") -> Optional[Dict]:
+@functools.lru_cache(maxsize=256)
+def _encode_params(filters_key: Tuple[Tuple[str, Union[str, tuple]], ...],
+                   lang: str) -> Tuple[Tuple[str, str], ...]:
     """
-    Call Eurostat Statistics API for a given dataset code and filters.
-    Returns JSON on success, or None if dataset is not available or any HTTP error occurs.
+    Encode a hashable filters representation (see build_params) into query pairs.
+    Cached: the same FILTERS shape recurs for every dataset of a crawl.
     """
     params: List[tuple] = [("lang", lang)]
 
-    if filters:
-        for dim, values in filters.items():
-            if isinstance(values, str):
-                vals = [v.strip() for v in values.split(",")]
+    for dim, values in filters_key:
+        if isinstance(values, str):
+            vals = [v.strip() for v in values.split(",")]
+        else:
+            vals = [str(v).strip() for v in values]
+
+        for v in vals:
+            if v:
+                params.append((dim, v))
+
+    return tuple(params)
+
+
+def build_params(filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+                 lang: str = "EN") -> List[tuple]:
+    """
+    Turn a filters dict into the (dimension, value) query pairs expected by Eurostat.
+    String values may be comma-separated; empty values are dropped.
+    """
+    filters_key = tuple(sorted(
+        (dim, values if isinstance(values, str) else tuple(values))
+        for dim, values in (filters or {}).items()
+    ))
+    return list(_encode_params(filters_key, lang))
+
+
+def _read_jsonstat_values(events, container_event: str) -> pd.Series:
+    """
+    Consume the events of a JSON-stat 'value' (dense list or sparse dict) from `events`
+    and return a pandas Series of flat position → value, with missing cells dropped.
+    Numbers go straight into typed arrays, with no per-cell Python objects kept;
+    non-numeric cells (strings, booleans) are kept as objects at their position.
+    """
+    positions = array("q")
+    values = array("d")
+    add_position, add_value = positions.append, values.append
+    other_positions: List[int] = []
+    other_values: List = []
+    all_int = True
+    pos = 0
+
+    # One tight loop per layout: this runs once per cell, so it only branches on the event
+    if container_event == "start_array":
+        for event, val in events:
+            if event == "number":
+                add_position(pos)
+                add_value(val)
+                if all_int and type(val) is not int:
+                    all_int = False
+            elif event == "end_array":
+                break
+            elif event != "null":
+                if event in ("start_map", "start_array"):
+                    raise ValueError("JSON-stat 'value' cells must be scalars")
+                other_positions.append(pos)
+                other_values.append(val)
+            pos += 1                        # dense: next list item (every cell counts)
+    elif container_event == "start_map":
+        for event, val in events:
+            if event == "map_key":
+                pos = int(val)              # sparse: {"<flat index>": value, ...}
+            elif event == "number":
+                add_position(pos)
+                add_value(val)
+                if all_int and type(val) is not int:
+                    all_int = False
+            elif event == "end_map":
+                break
+            elif event != "null":
+                if event in ("start_map", "start_array"):
+                    raise ValueError("JSON-stat 'value' cells must be scalars")
+                other_positions.append(pos)
+                other_values.append(val)
+
+    vals = np.frombuffer(values, dtype=np.float64)
+    if all_int:
+        vals = vals.astype(np.int64)     # keep integer counts integer, as json.loads would
+    series = pd.Series(vals, index=np.frombuffer(positions, dtype=np.int64))
+    if other_positions:
+        # Mixed cells: fall back to an object Series, as json.loads would give
+        others = pd.Series(other_values, index=np.asarray(other_positions, dtype=np.int64), dtype=object)
+        series = pd.concat([series.astype(object), others]).sort_index()
+    return series
+
+
+def read_jsonstat(fp) -> Dict:
+    """
+    Stream-parse a JSON-stat document from a binary file object.
+    Everything except 'value' is built as plain Python objects (dimensions are small);
+    'value' is decoded by _read_jsonstat_values straight into a pandas Series.
+    """
+    builder = ijson.ObjectBuilder()
+    # basic_parse skips ijson's per-event prefix strings; the nesting depth is tracked here
+    events = ijson.basic_parse(fp, use_float=True)
+    series = pd.Series([], dtype=np.int64)
+    depth = 0
+    top_key = None
+
+    for event, val in events:
+        if event == "map_key":
+            if depth == 1:
+                top_key = val
+            if val == "value" and (depth == 1 or (depth == 2 and top_key == "dataset")):
+                series = _read_jsonstat_values(events, next(events)[0])
+                continue
+        elif event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+        builder.event(event, val)
+
+    js = builder.value
+    data = js["dataset"] if "dataset" in js else js
+    data["value"] = series
+    return js
+
+
+def disk_cache(ttl_hours: float = 24):
+    """
+    Cache Eurostat responses under CACHE_DIR as gzip files, keyed by
+    (dataset_code, query params, lang), and parse them with read_jsonstat.
+    The wrapped function returns a streamed requests.Response; its body is written
+    to the cache chunk by chunk, so the raw payload is never held in memory.
+    Entries younger than `ttl_hours` are returned without any request; older ones are
+    revalidated with If-Modified-Since so a 304 reuses the cached copy.
+    Failed fetches (None) are never cached; if a stale entry exists it is returned instead.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(dataset_code: str,
+                    filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+                    lang: str = "EN",
+                    session: Optional[requests.Session] = None,
+                    headers: Optional[Dict[str, str]] = None) -> Optional[Dict]:
+            key_src = json.dumps({"d": dataset_code, "p": sorted(build_params(filters, lang)), "l": lang})
+            key = hashlib.sha1(key_src.encode("utf-8")).hexdigest()
+            path = os.path.join(CACHE_DIR, f"{key}.json.gz")
+
+            headers = dict(headers or {})
+            if os.path.exists(path):
+                mtime = os.path.getmtime(path)
+                if time.time() - mtime < ttl_hours * 3600:
+                    with gzip.open(path, "rb") as f:
+                        return read_jsonstat(f)
+                headers["If-Modified-Since"] = formatdate(mtime, usegmt=True)
+
+            resp = func(dataset_code, filters, lang, session, headers=headers)
+            if resp is None:
+                if not os.path.exists(path):
+                    return None
+                # Revalidation failed → the stale copy is better than no data
+                print(f"⚠ Using stale cached copy of '{dataset_code}'.")
+            elif resp is NOT_MODIFIED:
+                os.utime(path)   # cached copy is still current → restart the TTL
             else:
-                vals = [str(v).strip() for v in values]
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                # Unique per process and thread, so concurrent fetches of one key never share a file
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with resp, gzip.open(tmp_path, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=1 << 20):
+                        f.write(chunk)
+                os.replace(tmp_path, path)
+
+            with gzip.open(path, "rb") as f:
+                return read_jsonstat(f)
+        return wrapper
+    return decorator
+
 
-            for v in vals:
-                if v:
-                    params.append((dim, v))
+@disk_cache(ttl_hours=24)
+def fetch_eurostat_json(dataset_code: str,
+                        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+                        lang: str = "EN",
+                        session: Optional[requests.Session] = None,
+                        headers: Optional[Dict[str, str]] = None) -> Optional[Dict]:
+    """
+    Call Eurostat Statistics API for a given dataset code and filters.
+    Returns JSON on success, or None if dataset is not available or any HTTP error occurs.
+    Pass a shared `session` (see make_session) to reuse connections across calls.
+    The undecorated function returns the streamed response (or NOT_MODIFIED on HTTP 304);
+    disk_cache stores its body and hands back the parsed JSON-stat dict.
+    """
+    params = build_params(filters, lang)
 
     url = f"{BASE_URL}/{dataset_code}"
-    resp = requests.get(url, params=params, timeout=60)
+    resp = (session or requests).get(url, params=params, headers=headers, timeout=60, stream=True)
+
+    if resp.status_code == 304:
+        resp.close()   # no body; give the connection back to the pool
+        return NOT_MODIFIED
 
     if resp.status_code == 404:
         # Dataset not available for dissemination → just log and skip
@@ -50,11 +265,42 @@ def fetch_eurostat_json(dataset_code: str,
         # Don’t crash – just skip this dataset
         return None
 
-    return resp.json()
+    return resp
 
 # -------------------------------------------------
 # 2. JSON-stat → flat pandas.DataFrame
 # -------------------------------------------------
+# Decoders specialised per schema (dimension ids, sizes and category codes),
+# reused by every dataset of a crawl that shares the same schema
+_DECODER_CACHE: Dict[tuple, Callable[[np.ndarray], Dict[str, pd.Categorical]]] = {}
+
+
+def get_decoder(dim_ids: List[str],
+                dim_sizes: List[int],
+                dim_categories: Dict[str, List[str]]) -> Callable[[np.ndarray], Dict[str, pd.Categorical]]:
+    """
+    Return a function decoding flat JSON-stat indices into one categorical column per dimension.
+    Category dtypes and the array shape are built once per schema; codes are only
+    range-checked when a dimension has fewer categories than its declared size.
+    """
+    key = (tuple(dim_ids), tuple(dim_sizes), tuple(tuple(dim_categories[d]) for d in dim_ids))
+    decoder = _DECODER_CACHE.get(key)
+    if decoder is None:
+        shape = tuple(dim_sizes)
+        dtypes = [pd.CategoricalDtype(dim_categories[d]) for d in dim_ids]
+        validate = any(len(dim_categories[d]) != size for d, size in zip(dim_ids, dim_sizes))
+
+        def decoder(flat_idx: np.ndarray) -> Dict[str, pd.Categorical]:
+            coords = np.unravel_index(flat_idx, shape)
+            return {
+                name: pd.Categorical.from_codes(codes, dtype=dtype, validate=validate)
+                for name, codes, dtype in zip(dim_ids, coords, dtypes)
+            }
+
+        _DECODER_CACHE[key] = decoder
+    return decoder
+
+
 def jsonstat_to_dataframe(js: Dict) -> pd.DataFrame:
     """
     Convert a Eurostat JSON-stat 2.0 dataset (single 'dataset') into a flat DataFrame.
@@ -75,114 +321,114 @@ def jsonstat_to_dataframe(js: Dict) -> pd.DataFrame:
     for dim_name in dim_ids:
         cat = dim[dim_name]["category"]
         index = cat.get("index", {})  # safer than cat["index"]
-        
-        # Build position → code map
-        pos_to_code = {pos: code for code, pos in index.items()}
-        if not pos_to_code:
+        if not index:
             # Eurostat returned no categories for this dimension → insert placeholder
             dim_categories[dim_name] = ["_missing_"]
             continue
-        max_pos = max(pos_to_code.keys())
-        ordered_codes = [pos_to_code[i] for i in range(max_pos + 1)]
-        dim_categories[dim_name] = ordered_codes
-
-
-    # Total number of observations (cartesian product of dims)
-    n_obs = 1
-    for s in dim_sizes:
-        n_obs *= s
-
-    rows = []
-
-    # Precompute strides to decode flat index
-    strides = []
-    acc = 1
-    for size in reversed(dim_sizes):
-        strides.insert(0, acc)
-        acc *= size
-
-    # Handle both dense list and sparse dict "value"
-    def get_value_at(idx: int):
-        if isinstance(value, list):
-            return value[idx]
-        elif isinstance(value, dict):
-            return value.get(str(idx), None)
-        else:
-            return None
-
-    for flat_idx in range(n_obs):
-        remaining = flat_idx
-        coord_codes = {}
-        for dim_idx, size in enumerate(dim_sizes):
-            stride = strides[dim_idx]
-            coord_index = remaining // stride
-            remaining = remaining % stride
-
-            dim_name = dim_ids[dim_idx]
-            code_list = dim_categories[dim_name]
-            code = code_list[coord_index]
-            coord_codes[dim_name] = code
-
-        v = get_value_at(flat_idx)
-        # Skip missing values (Eurostat uses None or ":" in other formats)
-        if v is None:
-            continue
-
-        row = coord_codes.copy()
-        row["value"] = v
-        rows.append(row)
 
-    return pd.DataFrame(rows)
+        # Scatter the codes to their positions (index maps code → position)
+        positions = np.fromiter(index.values(), dtype=np.int64, count=len(index))
+        ordered_codes = np.empty(positions.max() + 1, dtype=object)
+        ordered_codes[positions] = list(index.keys())
+        dim_categories[dim_name] = ordered_codes.tolist()
+
+
+    # Skip missing values (Eurostat uses None or ":" in other formats)
+    if isinstance(value, pd.Series):
+        # Already decoded by read_jsonstat: flat position → value, missing cells dropped
+        if not value.index.is_monotonic_increasing:
+            value = value.sort_index()
+        present_idx = value.index.to_numpy()
+        present_vals = value.to_numpy()
+    elif isinstance(value, dict):
+        # Sparse: only the populated flat indices, never the full cartesian product
+        present_idx = np.fromiter((int(k) for k in value.keys()), dtype=np.int64, count=len(value))
+        present_vals = np.fromiter(value.values(), dtype=object, count=len(value))
+        keep = np.array([v is not None for v in present_vals], dtype=bool)
+        order = np.argsort(present_idx[keep], kind="stable")   # rows in flat-index order
+        present_idx = present_idx[keep][order]
+        present_vals = present_vals[keep][order]
+    else:
+        # Dense list (anything else carries no observations)
+        values = np.asarray(value if isinstance(value, list) else [], dtype=object)
+        mask = np.array([v is not None for v in values], dtype=bool)
+        present_idx = np.nonzero(mask)[0]
+        present_vals = values[mask]
+
+    # Decode every kept flat index into per-dimension coordinates in one shot.
+    # Dimensions have tiny cardinality (countries, units, ...) → categoricals
+    cols = get_decoder(dim_ids, dim_sizes, dim_categories)(present_idx)
+    cols["value"] = present_vals
+
+    return pd.DataFrame(cols, copy=False).infer_objects()
 
 
 # -------------------------------------------------
-# 3. High-level: crawl env_nwat datasets and save CSV
+# 3. High-level: crawl env_nwat datasets and save Parquet (+ optional CSV)
 # -------------------------------------------------
 #
 def crawl_eurostat_datasets(dataset_codes: List[str],
                             filters_per_dataset: Optional[Dict[str, Dict[str, Union[str, List[str]]]]] = None,
                             lang: str = "EN",
-                            out_csv: str = None ) -> pd.DataFrame:
+                            out_csv: str = None,
+                            write_csv: bool = False) -> pd.DataFrame:
+    frames_by_code: Dict[str, pd.DataFrame] = {}
+
+    # Download all datasets concurrently; parse each one as soon as it arrives
+    with make_session() as session, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {}
+        for code in dataset_codes:
+            print(f"🔎 Fetching Eurostat dataset: {code}")
+            filters = (filters_per_dataset or {}).get(code, {})
+            futures[executor.submit(fetch_eurostat_json, code, filters, lang, session)] = code
+
+        for future in as_completed(futures):
+            code = futures[future]
+            js = future.result()
+            if js is None:
+                print(f"⏭ Skipping dataset '{code}' due to previous error.")
+                continue
+
+            df = jsonstat_to_dataframe(js)
+
+            if df.empty:
+                print(f"⚠ No data returned for {code}")
+                continue
+
+            print(f"   {len(df)} rows retrieved for {code}")
+            frames_by_code[code] = df
+
+    # Keep the requested dataset order regardless of download completion order
     all_frames = []
-
+    sizes = []  # (dataset_code, n_rows) sidecar for each frame in all_frames
     for code in dataset_codes:
-        print(f"🔎 Fetching Eurostat dataset: {code}")
-        filters = (filters_per_dataset or {}).get(code, {})
-
-        js = fetch_eurostat_json(code, filters=filters, lang=lang)
-        if js is None:
-            print(f"⏭ Skipping dataset '{code}' due to previous error.")
-            continue
-
-        df = jsonstat_to_dataframe(js)
-
-        if df.empty:
-            print(f"⚠ No data returned for {code}")
-            continue
-
-        df["dataset_code"] = code
-
-        # -------------------------------------------------
-        # Generate OpenKIWAS_ID field
-        # -------------------------------------------------
-        df = df.reset_index(drop=True)
-
-        df["OpenKIWAS_ID"] = [
-            f"eurostat-{code}-{str(i+1).zfill(4)}"
-            for i in range(len(df))
-        ]
-
-        print(f"   {len(df)} rows retrieved for {code}")
-        all_frames.append(df)
+        if code in frames_by_code:
+            all_frames.append(frames_by_code[code])
+            sizes.append((code, len(frames_by_code[code])))
 
     if not all_frames:
-        print("⚠ No data retrieved, CSV will not be created.")
+        print("⚠ No data retrieved, output files will not be created.")
         return pd.DataFrame()
 
-     # -------------------------------------------------
+    full_df = pd.concat(all_frames, ignore_index=True)
+
+    # -------------------------------------------------
+    # Add dataset_code and OpenKIWAS_ID once on the combined frame
+    # -------------------------------------------------
+    counts = [n for _, n in sizes]
+    codes_repeated = np.repeat(np.array([code for code, _ in sizes]), counts)
+    full_df["dataset_code"] = codes_repeated
+
+    # eurostat-<code>-0001, 0002, ... numbered per dataset
+    indices = np.concatenate([np.arange(1, n + 1) for n in counts])
+    full_df["OpenKIWAS_ID"] = np.char.add(
+        np.char.add("eurostat-", codes_repeated),
+        np.char.add("-", np.char.zfill(indices.astype(str), 4)),
+    )
+
+    # -------------------------------------------------
     # Enforce required column order
     # -------------------------------------------------
-    full_df = pd.concat(all_frames, ignore_index=True)   
 
     desired_order = [
         "OpenKIWAS_ID",
@@ -201,14 +447,24 @@ def crawl_eurostat_datasets(dataset_codes: List[str],
 
     full_df = full_df[existing_columns]
 
+    # Per-dataset categoricals with different categories fall back to object on concat
+    for col in CATEGORICAL_COLUMNS:
+        if col in full_df.columns:
+            full_df[col] = full_df[col].astype("category")
+
     # -------------------------------------------------
     # Timestamped filename
     # ------------------------------------------------- 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    out_csv = f"eurostat_env_nwat_{timestamp}.csv"
+    out_parquet = f"eurostat_env_nwat_{timestamp}.parquet"
+
+    full_df.to_parquet(out_parquet, engine="pyarrow", compression="zstd", index=False)
+    print(f"✅ Done! Combined results saved to {out_parquet}")
 
-    full_df.to_csv(out_csv, index=False, encoding="utf-8")
-    print(f"✅ Done! Combined results saved to {out_csv}")
+    if write_csv:
+        out_csv = f"eurostat_env_nwat_{timestamp}.csv"
+        full_df.to_csv(out_csv, index=False, encoding="utf-8")
+        print(f"✅ Combined results also saved to {out_csv}")
 
     return full_df
 
@@ -1,11 +1,11 @@
-import json
+import orjson
 import sys
 
 def combine_json_files(json_files):
     combined_data = {}
     for file in json_files:
-        with open(file, 'r') as f:
-            data = json.load(f)
+        with open(file, 'rb') as f:
+            data = orjson.loads(f.read())
             combined_data.update(data)
 
     return combined_data
@@ -18,7 +18,7 @@ if __name__ == "__main__":
     json_files = sys.argv[1:]
     combined_data = combine_json_files(json_files)
 
-    with open("combined_data.json", "w") as f:
-        json.dump(combined_data, f, indent=4)
+    with open("combined_data.json", "wb") as f:
+        f.write(orjson.dumps(combined_data, option=orjson.OPT_INDENT_2))
 
     print("Combined JSON output saved to combined_data.json")
\ No newline at end of file
@@ -27,22 +27,21 @@ try:
 	print(f"Reading second file: {second_file}")
 	df_second = pd.read_excel(second_file)
 
-	# Ensure no missing or non-numeric values in the relevant columns
+	# Ensure no missing or non-numeric values in the relevant columns and convert them to integers
 	print("Cleaning and validating columns...")
-	df_first = df_first[pd.to_numeric(df_first['Project_ID'], errors='coerce').notna()]
-	df_second = df_second[pd.to_numeric(df_second['projectID'], errors='coerce').notna()]
-
-	# Convert columns to integers
-	df_first['Project_ID'] = df_first['Project_ID'].astype(int)
-	df_second['projectID'] = df_second['projectID'].astype(int)
+	ids_first = pd.to_numeric(df_first['Project_ID'], errors='coerce').dropna().astype('int64')
+	df_second['projectID'] = pd.to_numeric(df_second['projectID'], errors='coerce')
+	df_second = df_second.dropna(subset=['projectID']).astype({'projectID': 'int64'})
 
 	# Cross-referencing: Match 'Project_ID' from the first file with 'projectID' from the second
+	# (unique keys, so every row of the second file appears at most once, in its original order)
 	print("Performing cross-referencing...")
-	matched_df = df_second[df_second['projectID'].isin(df_first['Project_ID'])]
+	keys = ids_first.drop_duplicates().rename('projectID').to_frame()
+	matched_df = df_second.merge(keys, on='projectID', how='inner')
 
 	# Save the matched rows to a new CSV file
 	print(f"Saving results to {output_file}...")
-	matched_df.to_csv(output_file, sep=';', index=False)
+	matched_df.to_csv(output_file, sep=';', index=False, chunksize=100_000)
 
 	print(f"Cross-referenced rows successfully saved to {output_file}")
 
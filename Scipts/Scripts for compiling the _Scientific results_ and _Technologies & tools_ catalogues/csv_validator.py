@@ -1,5 +1,8 @@
 import csv
+import os
+import shutil
 import sys
+import threading
 
 def validate_and_fix_csv(input_file, output_file, expected_columns, delimiter=','):
 	"""
@@ -10,29 +13,40 @@ def validate_and_fix_csv(input_file, output_file, expected_columns, delimiter=',
 	:param delimiter: Delimiter used in the CSV file
 	:return: None
 	"""
-	with open(input_file, 'r') as infile:
-		reader = csv.reader(infile, delimiter=delimiter)
-		out = ""
-		count = 0
-		for line in reader:
-			# Remove null cells and shift data to the left
-			line = [cell for cell in line if cell]
-			if count == 1:
-				out += "|||||||||||\n"
-			# Count the number of columns
-			column_count = len(line)
+	# Rows are streamed to a temporary file next to the output, which then replaces it,
+	# so input_file and output_file may be the same file. os.open creates it with 0o666 minus
+	# the umask, the mode a plain open() gives (the umask is never changed: this runs in threads)
+	tmp_path = f"{output_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+	with open(input_file, 'r') as infile, \
+			open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666), 'w', newline='') as outfile:
+		try:
+			reader = csv.reader(infile, delimiter=delimiter)
+			count = 0
+			for line in reader:
+				# Remove null cells and shift data to the left
+				line = [cell for cell in line if cell]
+				if count == 1:
+					outfile.write("|||||||||||\n")
+				# Count the number of columns
+				column_count = len(line)
 
-			if column_count < expected_columns:
-				# Add empty values to the right to match the expected column count
-				line += [''] * (expected_columns - column_count)
-			elif column_count > expected_columns:
-				# Remove extra values from the right to match the expected column count
-				line = line[:expected_columns]
-			out += delimiter.join(line) + "\n"
-			count += 1
-	out += "|||||||||||\n"
-	with open(output_file, 'w', newline='') as outfile:
-		outfile.write(out)
+				if column_count < expected_columns:
+					# Add empty values to the right to match the expected column count
+					line += [''] * (expected_columns - column_count)
+				elif column_count > expected_columns:
+					# Remove extra values from the right to match the expected column count
+					line = line[:expected_columns]
+				outfile.write(delimiter.join(line) + "\n")
+				count += 1
+			outfile.write("|||||||||||\n")
+		except BaseException:
+			outfile.close()
+			os.remove(tmp_path)
+			raise
+	# Replacing an existing output keeps its mode
+	if os.path.exists(output_file):
+		shutil.copymode(output_file, tmp_path)
+	os.replace(tmp_path, output_file)
 
 
 
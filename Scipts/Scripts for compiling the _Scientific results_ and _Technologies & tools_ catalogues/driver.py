@@ -2,11 +2,18 @@ import glob
 import os
 import sys
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 from llm_analysis import llm_analysis
 
+# Columns of the tool table requested from the LLM (see xml_prompt_gen)
+OUTPUT_COLUMNS = ['ID', 'Name', 'Technology', 'Type', 'Data used as input', 'Produced datasets (openly available)', 'Demo (video if available)', 'Paper (if available)', 'Paper DOI (if available)', 'Project ID (if available)', 'Project Acronym (if available)', 'Service description']
+# Low-cardinality columns, stored dictionary-encoded in the Parquet output
+CATEGORICAL_OUTPUT_COLUMNS = ['Technology', 'Type', 'Project ID (if available)']
+
 def save_as_json(df, output_file):
     df = df.iloc[:, :12]
     df = df.dropna(how='all')
@@ -34,20 +41,82 @@ def save_as_json(df, output_file):
     print(f"JSON output saved to {output_file}")
 
 
+def save_as_parquet(df, output_file):
+    """
+    Save the concatenated output as a zstd-compressed Parquet file
+    :param df: Concatenated output DataFrame
+    :param output_file: Parquet file to write
+    :return: None
+    """
+    df = df.copy()
+    # Mixed text/number cells (pandas fallback reader) cannot be written as one Parquet column
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    df = df.astype({col: 'category' for col in CATEGORICAL_OUTPUT_COLUMNS})
+    df.to_parquet(output_file, engine='pyarrow', compression='zstd', index=False)
+    print(f"Parquet output saved to {output_file}")
+
+
+def read_outputs_arrow(all_files):
+    """
+    Read the per-project CSV files with Arrow's multithreaded reader and concatenate them once
+    :param all_files: CSV files written by llm_analysis
+    :return: DataFrame with OUTPUT_COLUMNS
+    """
+    read_options = pacsv.ReadOptions(column_names=OUTPUT_COLUMNS, encoding='utf-8')
+    parse_options = pacsv.ParseOptions(delimiter='|', invalid_row_handler=lambda row: 'skip')
+    # Read every column as text so the per-file schemas always match (a column may hold numbers in
+    # one file and text in another); save_as_json converts the IDs itself. Empty cells become nulls
+    # (as in pandas) so blank rows are dropped by save_as_json
+    convert_options = pacsv.ConvertOptions(column_types={col: pa.string() for col in OUTPUT_COLUMNS},
+                                           strings_can_be_null=True)
+    tables = []
+    for f in tqdm(all_files):
+        with open(f, 'rb') as fh:
+            # The first line of every file is the header returned by the LLM; replace it with OUTPUT_COLUMNS
+            fh.readline()
+            data = fh.read()
+        if not data.strip():
+            # Header only (e.g. an empty LLM answer): no rows, and Arrow rejects an empty CSV
+            continue
+        tables.append(pacsv.read_csv(pa.py_buffer(data), read_options=read_options, parse_options=parse_options,
+                                     convert_options=convert_options))
+    if not tables:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    return pa.concat_tables(tables).to_pandas()
+
+
+def read_outputs_pandas(all_files):
+    """
+    Fallback for read_outputs_arrow: read the per-project CSV files with pandas and concatenate them once
+    :param all_files: CSV files written by llm_analysis
+    :return: DataFrame with OUTPUT_COLUMNS
+    """
+    frames = []
+    for f in tqdm(all_files):
+        df_con = pd.read_csv(f, delimiter='|', encoding='utf-8', on_bad_lines='skip', index_col=False, engine='python')
+        df_con.columns = OUTPUT_COLUMNS
+        frames.append(df_con)
+    if not frames:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
 #%%
-def concatenate_output (output_file="output/llm_output.xlsx", json_output_file="output/llm_output.json"):
+def concatenate_output (output_file="output/llm_output.parquet", json_output_file="output/llm_output.json", excel_file=None):
     # Concatenate all the output files into a single file
     all_files = glob.glob("output/*.csv")
-    # add header to the dataframe ID,Name,Technology,Type,Data used as input,Produced datasets (openly available),Demo (video if available),Paper (if available),Paper DOI (if available),Project ID (if available),Service description
-    df = pd.DataFrame()
-    # Specify the data types for the columns
-    # ignore the frist two rows of  every file and add one row containing the project id of the file
-    for i in tqdm(range(len(all_files))):
-        # add row containing the project id in the first column
-        df_con = pd.read_csv(all_files[i], delimiter='|', encoding='utf-8', on_bad_lines='skip', index_col=False, engine='python')
-        df_con.columns = ['ID', 'Name', 'Technology', 'Type', 'Data used as input', 'Produced datasets (openly available)', 'Demo (video if available)', 'Paper (if available)', 'Paper DOI (if available)', 'Project ID (if available)', 'Project Acronym (if available)', 'Service description']
-        df = pd.concat([df, df_con], ignore_index=True)
-    df.to_excel(output_file, index=False)
+    try:
+        df = read_outputs_arrow(all_files)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        # e.g. a file that is not valid UTF-8
+        print(f"Arrow could not read the output files ({e}), falling back to pandas")
+        df = read_outputs_pandas(all_files)
+    save_as_parquet(df, output_file)
+    if excel_file:
+        # Human-readable sheet; xlsxwriter is much faster than the default openpyxl writer
+        df.to_excel(excel_file, index=False, engine='xlsxwriter')
+        print(f"Excel output saved to {excel_file}")
     print(f"All output files have been concatenated into {output_file}")
     save_as_json(df, json_output_file)
 
@@ -79,7 +148,7 @@ def main():
         for future in tqdm(as_completed(futures), total=len(futures)):
             progress += 1
 #%%
-    concatenate_output()
+    concatenate_output(excel_file="output/llm_output.xlsx")
 #%%
 if __name__ == "__main__":
     main()  # Call the main function
@@ -1,25 +1,73 @@
+import functools
+import os
+import threading
+
 import pandas as pd
 import sys
 
+# CORDIS projectPublications exports, searched in this order
+SOURCES = {
+	'fp7': 'projectPublicationsfp7_ab.xlsx',
+	'h2020': 'projectPublicationsh2020_ab.xlsx',
+	'heu': 'projectPublicationsheu_ab.xlsx',
+}
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def _build_index():
+	"""
+	Convert each Excel export to a Parquet file indexed by projectID (only if the Parquet file is missing or older than the Excel file)
+	:return: Dictionary of source name -> Parquet file path
+	"""
+	paths = {}
+	for src, excel_file in SOURCES.items():
+		parquet_file = os.path.splitext(excel_file)[0] + '.parquet'
+		have_excel, have_parquet = os.path.exists(excel_file), os.path.exists(parquet_file)
+		if not have_excel and not have_parquet:
+			raise FileNotFoundError(f"Neither {excel_file} nor {parquet_file} exists for the {src} publications")
+		# Without the Excel export an existing Parquet file is used as is
+		if have_excel and (not have_parquet or os.path.getmtime(parquet_file) < os.path.getmtime(excel_file)):
+			df = pd.read_excel(excel_file)
+			df['projectID'] = pd.to_numeric(df['projectID'], errors='coerce')
+			df = df.dropna(subset=['projectID']).astype({'projectID': 'int64'})
+			# Mixed text/number cells (e.g. DOIs) cannot be written as one Parquet column
+			for col in df.columns[df.dtypes == object]:
+				df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+			df.set_index('projectID', drop=False).sort_index().to_parquet(parquet_file)
+		paths[src] = parquet_file
+	return paths
+
+
+def _get_index():
+	"""
+	Load the projectID-indexed publications once per process (thread-safe)
+	:return: Dictionary of source name -> DataFrame indexed by projectID
+	"""
+	global _INDEX
+	with _INDEX_LOCK:
+		if _INDEX is None:
+			_INDEX = {src: pd.read_parquet(path) for src, path in _build_index().items()}
+		return _INDEX
+
+
+@functools.lru_cache(maxsize=2048)
 def find_papers_by_project_id(project_ids):
 	"""
 	Find papers associated with the given project ID
 	:param project_ids: Project ID to search for, output the papers associated with the project ID in the standard output
 	:return: DataFrame containing the papers associated with the project ID
 	"""
-
-	# Read the csv files
-
-	df_fp7 = pd.read_excel('projectPublicationsfp7_ab.xlsx')
-	df_h2020 = pd.read_excel('projectPublicationsh2020_ab.xlsx')
-	df_heu = pd.read_excel('projectPublicationsheu_ab.xlsx')
 	columns = ['title', 'doi', 'projectID', 'authors', 'journalTitle', 'abstract']
-	# Filter the DataFrame to find papers associated with the given project ID
-	matched_papers = df_fp7[df_fp7['projectID'] == project_ids]
-	if matched_papers.empty:
-		matched_papers = df_h2020[df_h2020['projectID'].astype(str).str.contains(str(project_ids))]
-	if matched_papers.empty:
-		matched_papers = df_heu[df_heu['projectID'].astype(str).str.contains(str(project_ids))]
+	project_id = int(project_ids)
+
+	# Return the papers of the first source that knows the project
+	matched_papers = pd.DataFrame()
+	for df in _get_index().values():
+		if project_id in df.index:
+			matched_papers = df.loc[[project_id]]
+			break
 	# Check if any papers were found
 	if matched_papers.empty:
 		print(f"No papers found for project ID: {project_ids}")
@@ -1,6 +1,9 @@
+import functools
+import hashlib
 import os
 
 import google.generativeai as genai
+import threading
 import time
 from dotenv import load_dotenv
 import sys
@@ -8,24 +11,64 @@ import sys
 from xml_prompt_gen import xml_prompt_gen
 from csv_validator import validate_and_fix_csv
 
+_INITIALIZED = False
+_INIT_LOCK = threading.Lock()
+
+CACHE_DIR = ".cache"
+
+
+def disk_memoize(cache_dir, ttl_hours=None):
+	"""
+	Cache the text returned by a single-argument function on disk, keyed by the sha1 of the argument
+	Empty results are not cached, so failures are retried on the next run
+	:param cache_dir: Directory holding one <sha1>.txt file per cached call
+	:param ttl_hours: Entries older than this are computed again (None: never expire)
+	:return: Decorator
+	"""
+	def decorator(func):
+		@functools.wraps(func)
+		def wrapper(arg):
+			key = hashlib.sha1(str(arg).encode('utf-8')).hexdigest()
+			path = os.path.join(cache_dir, f"{key}.txt")
+			if os.path.exists(path) and (ttl_hours is None or time.time() - os.path.getmtime(path) < ttl_hours * 3600):
+				with open(path, 'r', encoding='utf-8') as f:
+					return f.read()
+			result = func(arg)
+			if result:
+				os.makedirs(cache_dir, exist_ok=True)
+				tmp_path = f"{path}.{threading.get_ident()}.tmp"
+				with open(tmp_path, 'w', encoding='utf-8') as f:
+					f.write(result)
+				os.replace(tmp_path, path)
+			return result
+		return wrapper
+	return decorator
+
 
 def init():
 	"""
-	Initialize the Generative AI model
+	Initialize the Generative AI model (only the first call does any work)
 	:return: None
 	"""
-	# Getting API key to use the google generative ai model
-	# Make sure to create the .env file and add the GEN_AI_API_kEY which you can get from here: https://aistudio.google.com/app/apikey
-	# Load API key from .env file
-	load_dotenv()
-	google_api_key = os.getenv("GEN_AI_API_KEY")
-	if not google_api_key:
-		raise ValueError("API key not found! Make sure GEN_AI_API_KEY is set in the .env file.")
+	global _INITIALIZED
+	with _INIT_LOCK:
+		if _INITIALIZED:
+			return
+		# Getting API key to use the google generative ai model
+		# Make sure to create the .env file and add the GEN_AI_API_kEY which you can get from here: https://aistudio.google.com/app/apikey
+		# Load API key from .env file
+		load_dotenv()
+		google_api_key = os.getenv("GEN_AI_API_KEY")
+		if not google_api_key:
+			raise ValueError("API key not found! Make sure GEN_AI_API_KEY is set in the .env file.")
 
-	# Configure the Generative AI model
-	genai.configure(api_key=google_api_key)
+		# Configure the Generative AI model
+		genai.configure(api_key=google_api_key)
+		_INITIALIZED = True
 
 # Function to call the Google Generative AI API for a single prompt using the GenerativeModel class.
+# Identical prompts (e.g. on reruns) are answered from the on-disk cache.
+@disk_memoize(os.path.join(CACHE_DIR, "llm"))
 def call_genai(gen_prompt):
 	wait_time = 1  # Start with a short wait time
 	while True:
@@ -38,6 +81,11 @@ def call_genai(gen_prompt):
 			time.sleep(wait_time)
 			wait_time *= 2  # Exponential backoff for retrying
 
+# Prompts only depend on the project ID, so reruns skip the CORDIS fetches and XML parsing.
+# They expire after a day (like the Eurostat and Zenodo caches) so updated CORDIS pages and
+# publication exports reach the model; LLM answers are keyed on the prompt text and never expire
+cached_xml_prompt_gen = disk_memoize(os.path.join(CACHE_DIR, "prompts"), ttl_hours=24)(xml_prompt_gen)
+
 def llm_analysis(project_id, output_file):
 	"""
 	Generate a CSV file using the Generative AI model
@@ -49,7 +97,7 @@ def llm_analysis(project_id, output_file):
 	init()
 	# Generate the prompt
 
-	prompt = xml_prompt_gen(project_id)
+	prompt = cached_xml_prompt_gen(project_id)
 	if not prompt:
 		print("Prompt generation failed. Exiting...")
 	# Call the Generative AI model with the generated prompt
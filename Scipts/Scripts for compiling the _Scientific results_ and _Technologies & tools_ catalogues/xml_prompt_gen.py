@@ -1,11 +1,18 @@
 from bs4 import BeautifulSoup
 import requests
+from requests.adapters import HTTPAdapter
 import sys
-from io import StringIO
 
 from fetch_abstracts import fetch_abstracts
 from find_papers import find_papers_by_project_id
 
+# One keep-alive session shared by all threads of driver.py, sized for its worker pool
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_maxsize=16))
+
+# One format call per deliverable instead of five separate writes
+PAPER_TEMPLATE = "\tTitle: {}\n\tAuthors: {}\n\tJournal Article: {}\n\tDOI: {}\n\tAbstract: {}\n\n"
+RESULT_TEMPLATE = "\tTitle: {}\n\tAuthors: {}\n\tJournal Article: {}\n\tPublisher: {}\n\tDOI: {}\n"
 
 
 def fetch_data_from_url(url):
@@ -13,8 +20,7 @@ def fetch_data_from_url(url):
 	:param url: URL to fetch data from
 	:return: response text if successful, None otherwise
 	"""
-	# Placeholder function to fetch data from a URL
-	response = requests.get(url)
+	response = _SESSION.get(url, timeout=30)
 	if response.status_code == 200:
 		return response.text
 	else: # Handle errors
@@ -52,9 +58,9 @@ def parse_xml_and_create_prompt(xml_input_facts, project_id):
 		except AttributeError:
 			return None
 
-	soup_fact = BeautifulSoup(xml_input_facts, 'xml')
+	soup_fact = BeautifulSoup(xml_input_facts, 'lxml-xml')
 	xml_input_reports = fetch_data_from_url(f"https://cordis.europa.eu/project/id/{project_id}/reporting")
-	soup = BeautifulSoup(xml_input_reports, 'html.parser')
+	soup = BeautifulSoup(xml_input_reports, 'lxml')
 	li_element = soup.find('li', class_='c-article__download-item c-article__download-xml')
 	link = li_element.find('a', class_='o-btn o-btn--small c-btn--xml c-link-btn')['href'] if li_element else None
 
@@ -63,53 +69,55 @@ def parse_xml_and_create_prompt(xml_input_facts, project_id):
 		return
 
 	xml_input_reports = fetch_data_from_url(link)
-	soup_report = BeautifulSoup(xml_input_reports, 'xml')
-
-	prompt = StringIO()
-	prompt.write("BACKGROUND:\n")
-	prompt.write(f"{get_text_or_none(soup_report, 'title')}\n")
-	prompt.write(f"Reporting Period: {get_text_or_none(soup_fact, 'startDate')} - {get_text_or_none(soup_fact, 'endDate')}\n")
-	prompt.write(f"Summary of the context of the overall project {get_text_or_none(soup_report, 'summary')} \n {get_text_or_none(soup_fact, 'objective')}\n")
-	prompt.write("""TASK:
+	soup_report = BeautifulSoup(xml_input_reports, 'lxml-xml')
+
+	lines = []
+	lines.append("BACKGROUND:\n")
+	lines.append(f"{get_text_or_none(soup_report, 'title')}\n")
+	lines.append(f"Reporting Period: {get_text_or_none(soup_fact, 'startDate')} - {get_text_or_none(soup_fact, 'endDate')}\n")
+	lines.append(f"Summary of the context of the overall project {get_text_or_none(soup_report, 'summary')} \n {get_text_or_none(soup_fact, 'objective')}\n")
+	lines.append("""TASK:
 Analyze the text below to identify the different tools developed in the project (focus on tools developed by the projects and not on reports or papers), based only on the titles of the deliverables, reports and published papers.  Put all the tools in a table under those columns delimited with pipes, as follows:
 ID|Name|Technology|Type|Data used as input|Produced datasets (openly available)|Demo (video if available)|Paper (if available)|Paper DOI (if available)|Project ID (if available)|Project Acronym (if available)|Service description
 Make sure you cross-reference papers and deliverables. Just the create the table, csv optimized with | as a delimiter(DO NOT ADD ANY CODE BLOCKS in the response), make sure that there are ONLY 12 Columns. GIVE ONLY THE PLAIN TABLE IN THE RESPONSE!!!
 """)
-	prompt.write("DATA:\n")
+	lines.append("DATA:\n")
 
 	try:
 		deliverables = find_papers_by_project_id(project_id)
-		prompt.write(f"Deliverables (papers):\n")
+		lines.append(f"Deliverables (papers):\n")
 		for index, deliverable in deliverables.iterrows():
-			prompt.write(f"	Title: {deliverable['title']}\n")
-			prompt.write(f"	Authors: {deliverable.get('authors', '')}\n")
-			prompt.write(f"	Journal Article: {deliverable.get('journalTitle', '')}\n")
-			prompt.write(f"	DOI: {deliverable.get('doi', 'No DOI available')}\n")
-			prompt.write(f"	Abstract: {deliverable.get('abstract', 'No abstract available')}\n\n")
+			lines.append(PAPER_TEMPLATE.format(deliverable['title'],
+											   deliverable.get('authors', ''),
+											   deliverable.get('journalTitle', ''),
+											   deliverable.get('doi', 'No DOI available'),
+											   deliverable.get('abstract', 'No abstract available')))
 	except:
 		deliverables = soup_fact.find_all('result', type='relatedResult')
-		prompt.write(f"Deliverables: \n")
+		lines.append(f"Deliverables: \n")
 		for deliverable in deliverables:
-			prompt.write(f"	Title: {get_text_or_none(deliverable, 'title')}\n")
-			prompt.write(f"	Authors: {get_text_or_none(deliverable, 'authors')}\n")
-			prompt.write(f"	Journal Article: {get_text_or_none(deliverable, 'journalTitle')}\n")
-			prompt.write(f"	Publisher: {get_text_or_none(deliverable, 'publisher')}\n")
-			prompt.write(f"	DOI: {get_text_or_none(deliverable, 'doi')}\n")
+			lines.append(RESULT_TEMPLATE.format(get_text_or_none(deliverable, 'title'),
+												get_text_or_none(deliverable, 'authors'),
+												get_text_or_none(deliverable, 'journalTitle'),
+												get_text_or_none(deliverable, 'publisher'),
+												get_text_or_none(deliverable, 'doi')))
 			if deliverable.find('doi'):
 				abstract = fetch_abstracts(deliverable.find('doi').get_text())
-				prompt.write(f"Abstract: {abstract}\n")
-			prompt.write("\n")
-	prompt.write(f"Project ID: {project_id}\n")
-	prompt.write(f"Project Acronym: {get_text_or_none(soup_fact, 'acronym')}\n")
-	prompt.write(f"Grand doi: {get_text_or_none(soup_fact, 'grantDoi')}\n")
-	prompt.write(f"EC Signature Date: {get_text_or_none(soup_fact, 'ecSignatureDate')}\n")
-	prompt.write(f"Start Date: {get_text_or_none(soup_fact, 'startDate')}\n")
-	prompt.write(f"End Date: {get_text_or_none(soup_fact, 'endDate')}\n")
-	prompt.write(f"Funded under: {get_text_from_soup(soup, 'div.c-project-info__fund li')}\n")
-	prompt.write(f"{get_text_from_soup(soup, 'div.c-project-info__overall').replace('\t', '')}\n")
-	prompt.write(f"{get_text_from_soup(soup, 'div.c-project-info__eu').replace('\t', '')}\n")
-	prompt.write(f"\nProject Coordinator: {get_text_from_soup(soup, 'p.coordinated.coordinated-name')}\n")
-	return prompt.getvalue()
+				lines.append(f"Abstract: {abstract}\n")
+			lines.append("\n")
+	overall = get_text_from_soup(soup, 'div.c-project-info__overall').replace('\t', '')
+	eu_contribution = get_text_from_soup(soup, 'div.c-project-info__eu').replace('\t', '')
+	lines.append(f"Project ID: {project_id}\n")
+	lines.append(f"Project Acronym: {get_text_or_none(soup_fact, 'acronym')}\n")
+	lines.append(f"Grand doi: {get_text_or_none(soup_fact, 'grantDoi')}\n")
+	lines.append(f"EC Signature Date: {get_text_or_none(soup_fact, 'ecSignatureDate')}\n")
+	lines.append(f"Start Date: {get_text_or_none(soup_fact, 'startDate')}\n")
+	lines.append(f"End Date: {get_text_or_none(soup_fact, 'endDate')}\n")
+	lines.append(f"Funded under: {get_text_from_soup(soup, 'div.c-project-info__fund li')}\n")
+	lines.append(f"{overall}\n")
+	lines.append(f"{eu_contribution}\n")
+	lines.append(f"\nProject Coordinator: {get_text_from_soup(soup, 'p.coordinated.coordinated-name')}\n")
+	return "".join(lines)
 
 
 def xml_prompt_gen(project_id):
@@ -4,14 +4,20 @@
 # Created by Gerasimos Antzoulatos (CERTH) in the content of EU CSA Ideation project.
 #
 from datetime import datetime, timedelta
-import requests
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-import pandas as pd
+import asyncio
 import re
 import html
+import httpx
+import orjson
 import os
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import sqlite3
+import sys
 import time
-from urllib.parse import quote_plus
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote_plus, urlencode
 
 # Read your Zenodo personal access token from an environment variable.
 # # Example (bash): export ZENODO_TOKEN="..."
@@ -19,22 +25,78 @@ from urllib.parse import quote_plus
 ACCESS_TOKEN = os.getenv("ZENODO_TOKEN", "").strip()
 ZENODO_API_URL = "https://zenodo.org/api/records"
 ZENODO_SEARCH_URL = "https://zenodo.org/search"  # Base URL for Zenodo search
+MAX_CONCURRENCY = 8  # requests in flight to Zenodo at any time
+MAX_ATTEMPTS = 5
+CACHE_PATH = os.path.join(".cache", "zenodo.sqlite")  # raw API responses, reused across runs
+CACHE_TTL = timedelta(days=1)
+CACHE_KEEP = timedelta(days=30)  # entries not refreshed for this long are deleted
+WRITE_BATCH = 2000  # rows extracted, cleaned and written together
+
+
+# ----------------------------------------------------
+# On-disk cache of API responses
+# ----------------------------------------------------
+class ResponseCache:
+    """SQLite store of raw Zenodo API response bodies keyed by request URL.
+
+    Entries younger than ttl are served without touching the network; older ones
+    are revalidated with If-None-Match against their stored ETag. Entries older
+    than keep (queries no longer run) are deleted when the cache is opened.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, keep=CACHE_KEEP):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl.total_seconds()
+        self.db = sqlite3.connect(path)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, etag TEXT, fetched_at REAL, body BLOB)"
+            )
+            self.db.execute("DELETE FROM responses WHERE fetched_at < ?", (time.time() - keep.total_seconds(),))
+
+    def get(self, url):
+        """Return (body, etag, is_fresh) for url, or None if it was never cached."""
+        row = self.db.execute("SELECT body, etag, fetched_at FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        body, etag, fetched_at = row
+        return body, etag, time.time() - fetched_at < self.ttl
+
+    def put(self, url, body, etag=None):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (url, etag, fetched_at, body) VALUES (?, ?, ?, ?)",
+                (url, etag, time.time(), body),
+            )
+
+    def touch(self, url):
+        """Mark an entry as fresh again after a 304 Not Modified."""
+        with self.db:
+            self.db.execute("UPDATE responses SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def close(self):
+        self.db.close()
 
 
 # ----------------------------------------------------
 # HTML cleaning helper
 # ----------------------------------------------------
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
 def clean_html(text):
     """Remove HTML tags and normalize whitespace."""
     if not isinstance(text, str):
         return ""
     # Decode HTML entities (&nbsp;, &amp;, etc.)
-    text = html.unescape(text)
+    if "&" in text:
+        text = html.unescape(text)
     # Remove tags
-    text = re.sub(r"<[^>]+>", " ", text)
+    if "<" in text:
+        text = _TAG_RE.sub(" ", text)
     # Collapse whitespace
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return _SPACE_RE.sub(" ", text).strip()
 
 
 # ----------------------------------------------------
@@ -49,15 +111,14 @@ search_phrases = ["river", "reservoir", "aquifers", "underground water", "lake",
 # ----------------------------------------------------
 # Check the validity of the date string 
 # ----------------------------------------------------
+# Shape and month/day ranges only (a 30 February would pass), which is all the
+# string comparison against min_date needs, at a fraction of strptime's cost.
+_DATE_RE = re.compile(r"[0-9]{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12][0-9]|3[01])")
+
+
 def is_valid_date(date_str):
     """Check if date_str is a valid ISO date (YYYY-MM-DD)."""
-    if not isinstance(date_str, str):
-        return False
-    try:
-        datetime.strptime(date_str, "%Y-%m-%d")
-        return True
-    except ValueError:
-        return False
+    return isinstance(date_str, str) and _DATE_RE.fullmatch(date_str) is not None
 
 def get_search_url(query):
     """Generate a Zenodo search URL (website) for datasets.
@@ -71,246 +132,356 @@ def get_search_url(query):
 #--------------------------------------------------------
 def extract_publication_year(date_str):
     """Extract the YYYY year from an ISO publication date."""
-    try:
-        return datetime.strptime(date_str, "%Y-%m-%d").year
-    except Exception:
-        return None
+    return int(date_str[:4]) if is_valid_date(date_str) else None
 
 # -----------------------------------------------------------------------------------------------------------
 # Search Zenodo API
 # -----------------------------------------------------------------------------------------------------------
-# Setup: 5 attempts, starting with a 2-second delay, doubling the time.
-@retry(
-    stop = stop_after_attempt(5), 
-    wait = wait_exponential(multiplier=1, min=2, max=10),
-    retry = retry_if_exception_type((requests.exceptions.HTTPError, requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.RequestException))
-)
+async def fetch_page(client, sem, params, cache=None, cache_params=None):
+    """Fetch one page of Zenodo API results (served from cache when possible).
+
+    cache_params identifies the request in the cache instead of params, e.g. without
+    a date that changes every day.
+
+    Setup: 5 attempts, starting with a 2-second delay, doubling the time (max 10 s).
+    Only timeouts, connection errors, 429 and 5xx are retried; a 429 waits at least
+    as long as the Retry-After header asks for.
+    """
+    url = f"{ZENODO_API_URL}?{urlencode(sorted((cache_params or params).items()))}"
+    cached = cache.get(url) if cache is not None else None
+    request_headers = {}
+    if cached is not None:
+        body, etag, is_fresh = cached
+        if is_fresh:
+            return orjson.loads(body)
+        if etag:
+            request_headers["If-None-Match"] = etag
+
+    for attempt in range(MAX_ATTEMPTS):
+        retry_after = 0
+        try:
+            async with sem:
+                response = await client.get(ZENODO_API_URL, params=params, headers=request_headers)
+
+            # Stale cache entry is still current
+            if response.status_code == 304 and cached is not None:
+                cache.touch(url)
+                return orjson.loads(cached[0])
 
-def search_zenodo(query, sort_by="mostrecent", years_filter=7):
+            # Handle rate limiting politely (Zenodo may return 429).
+            if response.status_code == 429:
+                header = response.headers.get("Retry-After")
+                if header and header.isdigit():
+                    retry_after = int(header)
+
+            # For all non-2xx, raise (and retry 429, 5xx etc.)
+            response.raise_for_status()
+            if cache is not None:
+                cache.put(url, response.content, response.headers.get("ETag"))
+            return orjson.loads(response.content)
+        except httpx.HTTPError as e:
+            # Any other 4xx (e.g. a malformed query) fails the same way every time
+            retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code == 429 \
+                or e.response.status_code >= 500
+            if attempt == MAX_ATTEMPTS - 1 or not retryable:
+                raise
+            # Sleeping outside the semaphore lets other requests keep going.
+            await asyncio.sleep(max(retry_after, min(10, 2 ** (attempt + 1))))
+
+
+async def search_zenodo(client, sem, query, sort_by="bestmatch", years_filter=7, cache=None, all_versions=False):
     """Fetch datasets from Zenodo based on search query and filters.
 
     Notes:
-    - years_filter is applied client-side against metadata.publication_date (ISO YYYY-MM-DD).
+    - years_filter is applied server-side as a publication_date range in 'q', so older
+      records are never downloaded; the client-side check only guards against odd dates.
     - The 'type' parameter is kept as 'dataset' to match your intent; if Zenodo changes this,
       adjust here or move it into the 'q' field.
+    - Only the latest version of each record is returned unless all_versions is set.
+    - sort_by="bestmatch" (Zenodo's relevance ranking) front-loads the relevant records, so
+      RESULTS_LIMIT keeps the best matches; "mostrecent" keeps the newest ones instead.
     """
     PAGE_SIZE = 100
     RESULTS_LIMIT = 1000
     min_date = (datetime.today() - timedelta(days=years_filter * 365)).strftime("%Y-%m-%d")
 
     params = {
-        "q": query,
+        "q": f"({query}) AND publication_date:[{min_date} TO *]",
         "size": PAGE_SIZE,
         "type": "dataset",
         "sort": sort_by,
-        "page": 1,
-        "all_versions": True,
+        "all_versions": all_versions,
     }
+    # min_date moves every day; the cache is keyed on years_filter instead, so the
+    # stored pages (and their ETags) are reused and revalidated across days
+    cache_params = dict(params, q=query, years_filter=years_filter)
 
-    headers = {}
-    if ACCESS_TOKEN:
-        headers["Authorization"] = f"Bearer {ACCESS_TOKEN}"
-    else:
-        # Public records can still be queried without a token.
-        # (Leaving this as a print so it's visible when you run the script.)
-        print("⚠ No ZENODO_TOKEN found in environment; continuing without Authorization header.")
+    def fetch(page):
+        return fetch_page(client, sem, dict(params, page=page), cache, dict(cache_params, page=page))
 
     all_datasets = []
     search_url = get_search_url(query)
     print(f"\n🔎 Searching Zenodo for: '{query}' → {search_url} (Sorted by {sort_by}, since {min_date})")
 
-    while len(all_datasets) < RESULTS_LIMIT:
-        response = requests.get(
-            ZENODO_API_URL,
-            params=params,
-            headers=headers or None,
-            timeout=(10, 30),  # (connect, read) timeouts
-        )
-
-        # Handle rate limiting politely (Zenodo may return 429).
-        if response.status_code == 429:
-            retry_after = response.headers.get("Retry-After")
-            if retry_after and retry_after.isdigit():
-                time.sleep(int(retry_after))
-            # Raise to trigger tenacity retry.
-            response.raise_for_status()
-
-        # For all other non-2xx, raise so tenacity can retry (for 5xx etc.)
-        response.raise_for_status()
-
-        json_resp = response.json()
-        results = json_resp.get("hits", {}).get("hits", [])
-        print(f" Found {len(results)} results on page {params['page']}.")
+    page = 1
+    batch = [await fetch(page)]
+    total = batch[0].get("hits", {}).get("total")
+
+    while batch:
+        for json_resp in batch:
+            results = json_resp.get("hits", {}).get("hits", [])
+            print(f" Found {len(results)} results on page {page}.")
+
+            if not results:
+                print(f"⚠ No results found for '{query}'")
+                return all_datasets, search_url
+
+            # ✅ Filter by valid and recent publication dates (the query already
+            # asks for recent ones; this is a safety net). Results are appended
+            # directly and the loop stops as soon as RESULTS_LIMIT is reached.
+            remaining = RESULTS_LIMIT - len(all_datasets)
+            kept = 0
+            out_of_range = False
+            for r in results:
+                pub_date = r.get("metadata", {}).get("publication_date", "")
+                if not is_valid_date(pub_date):
+                    continue  # skip invalid or missing dates
+                if pub_date < min_date:
+                    if sort_by == "mostrecent":
+                        # Everything after this is older still
+                        out_of_range = True
+                        break
+                    continue
+                all_datasets.append(r)
+                kept += 1
+                if kept == remaining:
+                    break
+
+            print(f"📄 Query '{query}': {kept} results (Total kept: {len(all_datasets)})")
+
+            # Stop at the limit, past min_date or if there is no next page
+            if len(all_datasets) >= RESULTS_LIMIT or out_of_range or "next" not in (json_resp.get("links") or {}):
+                return all_datasets, search_url
+
+            page += 1
+
+        if isinstance(total, int):
+            # hits.total is known: request every page that may still be needed
+            # to reach RESULTS_LIMIT at once instead of walking them one by one.
+            last_page = min(-(-total // PAGE_SIZE), page + (RESULTS_LIMIT - len(all_datasets) - 1) // PAGE_SIZE)
+            pages = range(page, max(page, last_page) + 1)
+            batch = await asyncio.gather(*[fetch(p) for p in pages])
+        else:
+            batch = [await fetch(page)]
 
-        if not results:
-            print(f"⚠ No results found for '{query}'")
-            break
+    return all_datasets, search_url
 
-        # ✅ Filter by valid and recent publication dates
-        filtered_results = []
-        for r in results:
-            pub_date = r.get("metadata", {}).get("publication_date", "")
-            if not is_valid_date(pub_date):
-                continue  # skip invalid or missing dates
-            if pub_date >= min_date:
-                filtered_results.append(r)
 
-        all_datasets.extend(filtered_results[: RESULTS_LIMIT - len(all_datasets)])
-        print(f"📄 Query '{query}': {len(filtered_results)} results (Total kept: {len(all_datasets)})")
+async def search_all(search_phrases, sort_by="bestmatch", years_filter=7, cache=None, all_versions=False):
+    """Run search_zenodo for all phrases concurrently over one shared HTTP/2 client.
 
-        # Stop if there is no next page
-        if "next" not in (json_resp.get("links") or {}):
-            break
+    Returns one (datasets, search_url) tuple or exception per phrase, in input order.
+    """
+    headers = {}
+    if ACCESS_TOKEN:
+        headers["Authorization"] = f"Bearer {ACCESS_TOKEN}"
+    else:
+        # Public records can still be queried without a token.
+        # (Leaving this as a print so it's visible when you run the script.)
+        print("⚠ No ZENODO_TOKEN found in environment; continuing without Authorization header.")
 
-        params["page"] += 1
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    # HTTP/2 multiplexes the concurrent requests over a few TLS connections
+    limits = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+    timeout = httpx.Timeout(30.0, connect=10.0)
+    async with httpx.AsyncClient(http2=True, limits=limits, timeout=timeout, headers=headers) as client:
+        tasks = [
+            search_zenodo(client, sem, phrase, sort_by, years_filter, cache, all_versions)
+            for phrase in search_phrases
+        ]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Human-friendly column order of the output CSV
+CSV_COLUMNS = [
+    "OpenKIWAS_ID",
+    "Search Phrase",
+    "Title",
+    "DOI",
+    "Publication Date",
+    "Publication Year",
+    "Access",
+    "Keywords",
+    "License",
+    "Version",
+    "Description",
+    "Creators",
+    "Number of Files",
+    "File Names",
+    "File Sizes (bytes)",
+    "File Links",
+    "Views",
+    "Downloads",
+    "Subjects",
+    "Communities",
+    "Grants",
+    "Search Query URL",
+    "Dataset Page",
+    "Metadata API URL",
+    "Related Identifiers"
+]
+# Counts are written as integers, everything else as text
+CSV_COUNT_COLUMNS = ("Number of Files", "Views", "Downloads")
+CSV_SCHEMA = pa.schema(
+    [(c, pa.int64() if c in CSV_COUNT_COLUMNS else pa.string()) for c in CSV_COLUMNS]
+)
 
-    return all_datasets, search_url
 
+def extract_metadata(dataset, search_phrases, search_url):
+    """Extract metadata from a Zenodo dataset as one CSV row.
 
-def extract_metadata(datasets, search_phrase, search_url):
-    """Extract metadata from Zenodo datasets."""
-    extracted_data = []
-    for dataset in datasets:
-        metadata = dataset.get("metadata", {})
-        stats = dataset.get("stats", {})
-
-        # Files are typically at the top level in /api/records responses.
-        files = dataset.get("files") or metadata.get("files") or []
-
-        record_id = dataset.get("id", "Unknown")
-        dataset_html_link = dataset.get("links", {}).get("self_html", "https://zenodo.org")
-        dataset_metadata_api = f"{ZENODO_API_URL}/{record_id}"
-
-        # Clean description (remove HTML)
-        description_raw = metadata.get("description", "No Description")
-        description_clean = clean_html(description_raw)  
-
-        pub_date = metadata.get("publication_date", "")
-        pub_year = extract_publication_year(pub_date)
-
-        extracted_data.append(
-            {
-                "Search Phrase": search_phrase,
-                "Search Query URL": search_url,
-                "Dataset Page": dataset_html_link,
-                "Metadata API URL": dataset_metadata_api,
-                "Title": metadata.get("title", "No Title"),
-                "DOI": metadata.get("doi", "No DOI"),
-                "Description": description_clean,
-                "Creators": ", ".join(
-                    [c.get("name", "Unknown") for c in metadata.get("creators", [])]
-                ),
-                #"Publication Date": metadata.get("publication_date", "Unknown Date"),
-                "Publication Date": pub_date,
-                "Publication Year": pub_year if pub_year else "Unknown",
-                "Access": metadata.get("access_right", "Unknown Access"),
-                "Keywords": ", ".join(metadata.get("keywords", []))
-                if metadata.get("keywords")
-                else "No Keywords",
-                "License": metadata.get("license", {}).get("id", "No License"),
-                "Version": metadata.get("version", "Unknown Version"),
-                "Number of Files": len(files),
-                "File Names": ", ".join(
-                    [f.get("key") or f.get("filename") or "Unknown" for f in files]
-                ),
-                "File Sizes (bytes)": ", ".join(
-                    [str(f.get("size", "Unknown")) for f in files]
-                ),
-                "File Links": ", ".join(
-                    [ (f.get("links", {}) or {}).get("self") or (f.get("links", {}) or {}).get("download") or "Unknown" for f in files ]
-                ),
-                "Views": stats.get("views", 0),
-                "Downloads": stats.get("downloads", 0),
-                "Related Identifiers": ", ".join(
-                    [r.get("identifier", "Unknown") for r in metadata.get("related_identifiers", [])]
-                ),
-                "Subjects": ", ".join(
-                    [s.get("term", "Unknown") for s in metadata.get("subjects", [])]
-                ),
-                "Communities": ", ".join(
-                    [c.get("title", "Unknown") for c in metadata.get("communities", [])]
-                ),
-                "Grants": ", ".join(
-                    [g.get("id", "Unknown") for g in metadata.get("grants", [])]
-                )
-            }
-        )
-
-    return extracted_data
-
-
-def search_and_save_results(search_phrases, sort_by="mostrecent", years_filter=5):
+    search_phrases lists every phrase that found the dataset.
+    """
+    metadata = dataset.get("metadata", {})
+    stats = dataset.get("stats", {})
+
+    # Files are typically at the top level in /api/records responses.
+    files = dataset.get("files") or metadata.get("files") or []
+
+    record_id = dataset.get("id", "Unknown")
+    dataset_html_link = dataset.get("links", {}).get("self_html", "https://zenodo.org")
+    dataset_metadata_api = f"{ZENODO_API_URL}/{record_id}"
+
+    pub_date = metadata.get("publication_date", "")
+    pub_year = extract_publication_year(pub_date)
+    keywords = metadata.get("keywords")
+    if files:
+        file_links = [f.get("links") or {} for f in files]
+        file_names = ", ".join([f.get("key") or f.get("filename") or "Unknown" for f in files])
+        file_sizes = ", ".join([str(f.get("size", "Unknown")) for f in files])
+        file_urls = ", ".join([l.get("self") or l.get("download") or "Unknown" for l in file_links])
+    else:
+        # Fast path: many records have no files at all
+        file_names = file_sizes = file_urls = ""
+
+    # Keys in the order of CSV_COLUMNS. OpenKIWAS_ID is added by the writer, which
+    # also turns Description_raw into the cleaned Description for the rows it keeps.
+    row = {
+        "Search Phrase": ", ".join(search_phrases),
+        "Title": metadata.get("title", "No Title"),
+        "DOI": metadata.get("doi", "No DOI"),
+        #"Publication Date": metadata.get("publication_date", "Unknown Date"),
+        "Publication Date": pub_date,
+        "Publication Year": str(pub_year) if pub_year else "Unknown",
+        "Access": metadata.get("access_right", "Unknown Access"),
+        "Keywords": ", ".join(keywords) if keywords else "No Keywords",
+        "License": metadata.get("license", {}).get("id", "No License"),
+        "Version": metadata.get("version", "Unknown Version"),
+        "Description_raw": metadata.get("description", "No Description"),
+        "Creators": ", ".join([c.get("name", "Unknown") for c in metadata.get("creators", [])]),
+        "Number of Files": len(files),
+        "File Names": file_names,
+        "File Sizes (bytes)": file_sizes,
+        "File Links": file_urls,
+        "Views": stats.get("views", 0),
+        "Downloads": stats.get("downloads", 0),
+        "Subjects": ", ".join([s.get("term", "Unknown") for s in metadata.get("subjects", [])]),
+        "Communities": ", ".join([c.get("title", "Unknown") for c in metadata.get("communities", [])]),
+        "Grants": ", ".join([g.get("id", "Unknown") for g in metadata.get("grants", [])]),
+        "Search Query URL": search_url,
+        "Dataset Page": dataset_html_link,
+        "Metadata API URL": dataset_metadata_api,
+        "Related Identifiers": ", ".join(
+            [r.get("identifier", "Unknown") for r in metadata.get("related_identifiers", [])]
+        ),
+    }
+    # Zenodo sometimes returns numbers where text is expected (e.g. a numeric version).
+    # Coerce to the CSV_SCHEMA types here, so a bad value fails this record rather than
+    # the Arrow batch of the whole write; missing values stay None (empty cells).
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key in CSV_COUNT_COLUMNS:
+            row[key] = int(value)
+        elif not isinstance(value, str):
+            row[key] = str(value)
+    return row
+
+
+def search_and_save_results(search_phrases, sort_by="bestmatch", years_filter=5, all_versions=False):
     """Search Zenodo and save results to CSV."""
-    all_results = []
-    for phrase in search_phrases:
-        print(f"\n🟢 Processing search phrase: '{phrase}'...")
-
-        try:
-            datasets, search_url = search_zenodo(phrase, sort_by, years_filter)
-            metadata_list = extract_metadata(datasets, phrase, search_url)
-            all_results.extend(metadata_list)
-        except Exception as e:
-            print(f"Error processing phrase '{phrase}': {e}")
-
-    if not all_results:
+    print(f"\n🟢 Processing {len(search_phrases)} search phrases...")
+    cache = ResponseCache()
+    try:
+        searches = asyncio.run(search_all(search_phrases, sort_by, years_filter, cache, all_versions))
+    finally:
+        cache.close()
+
+    for phrase, result in zip(search_phrases, searches):
+        if isinstance(result, BaseException):
+            print(f"Error processing phrase '{phrase}': {result}")
+    if not any(not isinstance(result, BaseException) and result[0] for result in searches):
         print("\n⚠ No results collected, CSV will not be created.")
         return
 
-    results_df = pd.DataFrame(all_results)
-
-    # --- Add OpenKIWAS_ID (opendata-<search_phrase>-0001, 0002, ...)
-    results_df["OpenKIWAS_ID"] = (
-        "opendata-"
-        + results_df["Search Phrase"].astype(str).str.replace(" ", "_", regex=False)
-        + "-"
-        + (results_df.groupby("Search Phrase").cumcount() + 1).astype(str).str.zfill(4)
-    )
-
-    # Optional: reorder columns to be more human-friendly
-    column_order = [
-        "OpenKIWAS_ID",
-        "Search Phrase",
-        "Title",
-        "DOI",
-        "Publication Date",
-        "Publication Year",
-        "Access",
-        "Keywords",
-        "License",
-        "Version",
-        "Description",
-        "Creators",
-        "Number of Files",
-        "File Names",
-        "File Sizes (bytes)",
-        "File Links",
-        "Views",
-        "Downloads",
-        "Subjects",
-        "Communities",
-        "Grants",
-        "Search Query URL",
-        "Dataset Page",
-        "Metadata API URL",
-        "Related Identifiers"
-    ]
-
-    # Keep only columns that actually exist (safety)
-    column_order = [c for c in column_order if c in results_df.columns]
-    results_df = results_df[column_order]
-
-    csv_filename = "zenodo_results.csv"
+    # The same record is often found by several phrases (river, flood, flow, ...):
+    # keep its first occurrence and remember every phrase that matched it.
+    unique = {}
+    n_hits = 0
+    for phrase, result in zip(search_phrases, searches):
+        if isinstance(result, BaseException):
+            continue
+        datasets, search_url = result
+        n_hits += len(datasets)
+        for dataset in datasets:
+            key = dataset.get("id") or ("no-id", id(dataset))
+            record = unique.setdefault(key, (dataset, [], search_url))
+            if phrase not in record[1]:
+                record[1].append(phrase)
+    records = list(unique.values())
+    print(f"\n🔁 {n_hits} hits, {len(records)} unique records across all search phrases.")
+
+    csv_filename = "zenodo_results.csv.gz"
 
     # Get current date and time
     timestamp = datetime.now().strftime("%Y-%m-%d_%H%M")
 
     # Split the filename into name and extension
-    name, ext = csv_filename.rsplit('.', 1)
+    name, ext = csv_filename.split('.', 1)
     
     # Create new filename with timestamp suffix
     csv_filename = f"{name}_{timestamp}.{ext}"
 
-    results_df.to_csv(csv_filename, index=False, encoding="utf-8")
+    # Rows are extracted and written WRITE_BATCH at a time, so memory stays flat.
+    # clean_html is GIL-bound regex work, so each batch's descriptions are cleaned
+    # on all cores; only the strings travel to the worker processes.
+    # --- OpenKIWAS_ID (opendata-<first search_phrase>-0001, 0002, ...): one prefix
+    # per phrase and an inline counter, nothing per row but the number
+    id_prefixes = {phrase: f"opendata-{str(phrase).replace(' ', '_')}-" for phrase in search_phrases}
+    id_counter = Counter()
+    with pa.CompressedOutputStream(csv_filename, "gzip") as sink, \
+            pacsv.CSVWriter(sink, CSV_SCHEMA) as writer, \
+            ProcessPoolExecutor() as pool:
+        for start in range(0, len(records), WRITE_BATCH):
+            rows = []
+            for dataset, phrases, search_url in records[start:start + WRITE_BATCH]:
+                try:
+                    row = extract_metadata(dataset, phrases, search_url)
+                except Exception as e:
+                    print(f"Error processing record '{dataset.get('id')}': {e}")
+                    continue
+                first_phrase = phrases[0]
+                id_counter[first_phrase] += 1
+                row["OpenKIWAS_ID"] = f"{id_prefixes[first_phrase]}{id_counter[first_phrase]:04d}"
+                rows.append(row)
+
+            # Each batch goes to pyarrow's native CSV writer as one set of columns.
+            # HTML is cleaned only here, for the deduplicated rows actually written.
+            columns = {c: [row[c] for row in rows] for c in CSV_COLUMNS if c != "Description"}
+            columns["Description"] = list(
+                pool.map(clean_html, [row["Description_raw"] for row in rows], chunksize=64)
+            )
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=CSV_SCHEMA))
 
     print(f"\n✅ Search complete! Cleaned results saved to '{csv_filename}'")
 
@@ -319,4 +490,15 @@ def search_and_save_results(search_phrases, sort_by="mostrecent", years_filter=5
 # Run the script
 # ----------------------------------------------------
 if __name__ == "__main__":
-    search_and_save_results(search_phrases, sort_by="mostrecent", years_filter=5)
+    # --all-versions also returns the older versions of every record
+    # --sort=mostrecent keeps the newest records instead of the best matches
+    sort_by, all_versions = "bestmatch", False
+    for arg in sys.argv[1:]:
+        if arg == "--all-versions":
+            all_versions = True
+        elif arg in ("--sort=bestmatch", "--sort=mostrecent"):
+            sort_by = arg.split("=", 1)[1]
+        else:
+            print("Usage: python ZenodoSearch_fixed.py [--all-versions] [--sort=bestmatch|mostrecent]")
+            sys.exit(1)
+    search_and_save_results(search_phrases, sort_by=sort_by, years_filter=5, all_versions=all_versions)